@@ -2,17 +2,26 @@
 Enhanced composite action generation for GitHub Actions
 """
 
+import itertools
 import re
-import yaml
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional
 
-from utils import sanitize_name
-from jenkins_extractors import (
-    extract_tools, extract_git_steps, extract_sonarqube_steps, 
-    extract_docker_steps, extract_kubectl_steps, extract_input_steps,
-    extract_credentials_usage, extract_steps_commands
-)
+from utils import sanitize_name, env_input_name, secret_name
+from jenkins_extractors import StageAnalysis, analyze_stage
+
+# PyYAML is only needed once actions are written; see _load_yaml()
+_yaml: Any = None
+_YamlDumper: Any = None
+
+_PARAM_REF_RE = re.compile(r"\$\{params\.([^}]+)\}")
+_SONAR_KEY_RE = re.compile(r"-Dsonar\.projectKey=([^\s]+)")
+_SONAR_NAME_RE = re.compile(r"-Dsonar\.projectName=([^\s'\"]+)")
+# Major versions must not be part of a longer number (e.g. the "11" in "1.8.0_211")
+_JDK_VER_RE = re.compile(r"(?<!\d)(11|17|21)(?!\d)")
+_NODE_VER_RE = re.compile(r"(?<!\d)(16|18|20)(?!\d)")
+_SKIP_CMD_RE = re.compile(r"^(?:git |docker build|docker push)|withSonarQubeEnv")
 
 
 def generate_tool_setup_steps(tools: Dict[str, str]) -> List[Dict[str, Any]]:
@@ -24,13 +33,9 @@ def generate_tool_setup_steps(tools: Dict[str, str]) -> List[Dict[str, Any]]:
         java_version = "8"  # Default
         if "jdk" in tools:
             # Try to extract version from JDK name
-            jdk_name = tools["jdk"].lower()
-            if "11" in jdk_name:
-                java_version = "11"
-            elif "17" in jdk_name:
-                java_version = "17"
-            elif "21" in jdk_name:
-                java_version = "21"
+            m = _JDK_VER_RE.search(tools["jdk"])
+            if m:
+                java_version = m.group(1)
         
         setup_steps.append({
             "name": "Set up JDK",
@@ -57,11 +62,9 @@ def generate_tool_setup_steps(tools: Dict[str, str]) -> List[Dict[str, Any]]:
         node_version = "18"  # Default
         if "nodejs" in tools:
             # Try to extract version
-            nodejs_name = tools["nodejs"].lower()
-            if "16" in nodejs_name:
-                node_version = "16"
-            elif "20" in nodejs_name:
-                node_version = "20"
+            m = _NODE_VER_RE.search(tools["nodejs"])
+            if m:
+                node_version = m.group(1)
         
         setup_steps.append({
             "name": "Set up Node.js",
@@ -101,7 +104,7 @@ def convert_git_steps_to_actions(git_steps: List[Dict[str, Any]]) -> List[Dict[s
             branch = git_step["branch"]
             # Handle parameter references
             if "${params." in branch:
-                param_name = re.search(r"\$\{params\.([^}]+)\}", branch)
+                param_name = _PARAM_REF_RE.search(branch)
                 if param_name:
                     with_params["ref"] = f"${{{{ inputs.{param_name.group(1)} }}}}"
             else:
@@ -109,7 +112,7 @@ def convert_git_steps_to_actions(git_steps: List[Dict[str, Any]]) -> List[Dict[s
         
         if git_step["credentialsId"]:
             # Convert credential ID to secret reference
-            cred_id = git_step["credentialsId"].upper().replace("-", "_")
+            cred_id = secret_name(git_step["credentialsId"])
             with_params["token"] = f"${{{{ secrets.{cred_id} }}}}"
         
         if with_params:
@@ -139,12 +142,12 @@ def convert_sonarqube_steps(sonar_steps: List[Dict[str, Any]]) -> List[Dict[str,
         with_params = {}
         for cmd in sonar_step["commands"]:
             if "-Dsonar.projectKey=" in cmd:
-                key_match = re.search(r"-Dsonar\.projectKey=([^\s]+)", cmd)
+                key_match = _SONAR_KEY_RE.search(cmd)
                 if key_match:
                     with_params["projectKey"] = key_match.group(1)
             
             if "-Dsonar.projectName=" in cmd:
-                name_match = re.search(r"-Dsonar\.projectName=([^\s'\"]+)", cmd)
+                name_match = _SONAR_NAME_RE.search(cmd)
                 if name_match:
                     with_params["projectName"] = name_match.group(1).strip("'\"")
         
@@ -171,6 +174,7 @@ def convert_sonarqube_steps(sonar_steps: List[Dict[str, Any]]) -> List[Dict[str,
 def convert_docker_steps(docker_steps: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
     """Convert Docker steps to GitHub Actions"""
     docker_actions = []
+    login_added = False
     
     for docker_step in docker_steps:
         if docker_step["type"] == "build":
@@ -181,7 +185,7 @@ def convert_docker_steps(docker_steps: List[Dict[str, Any]]) -> List[Dict[str, A
             })
         elif docker_step["type"] == "push":
             # Add Docker login if not already present
-            if not any("docker/login-action" in str(action.get("uses", "")) for action in docker_actions):
+            if not login_added:
                 docker_actions.append({
                     "name": "Login to DockerHub",
                     "uses": "docker/login-action@v2",
@@ -190,6 +194,7 @@ def convert_docker_steps(docker_steps: List[Dict[str, Any]]) -> List[Dict[str, A
                         "password": "${{ secrets.DOCKER_PASSWORD }}"
                     }
                 })
+                login_added = True
             
             docker_actions.append({
                 "name": "Push Docker image",
@@ -208,19 +213,50 @@ def convert_input_steps_to_environment(input_steps: List[Dict[str, Any]], stage_
     return ""
 
 
+def generate_post_steps(stage_name: str, post_info: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """Generate artifact upload and command steps for a stage's post block"""
+    post_steps = []
+    for kind in ("always", "success", "failure"):
+        if kind not in post_info:
+            continue
+        pdata = post_info[kind]
+        if "archive" in pdata:
+            post_steps.append({
+                "name": f"Upload artifacts ({kind})",
+                "if": f"{kind}()",
+                "uses": "actions/upload-artifact@v4",
+                "with": {
+                    "name": f"{sanitize_name(stage_name)}-{kind}-artifacts",
+                    "path": pdata["archive"]
+                }
+            })
+        post_steps.extend(
+            {
+                "name": f"Post {kind}",
+                "if": f"{kind}()",
+                "run": cmd,
+                "shell": "bash"
+            }
+            for cmd in pdata.get("commands", [])
+        )
+    return post_steps
+
+
 def generate_enhanced_composite_action(stage_name: str, stage_body: str, stage_env: Dict[str, str], 
-                                     stage_agent: Dict[str, Any], post_info: Dict[str, Any]) -> Dict[str, Any]:
+                                     stage_agent: Dict[str, Any], post_info: Dict[str, Any],
+                                     analysis: Optional[StageAnalysis] = None) -> Dict[str, Any]:
     """Generate enhanced composite action with Jenkins feature support"""
     
-    # Extract enhanced features
-    tools = extract_tools(stage_body)
-    git_steps = extract_git_steps(stage_body)
-    sonar_steps = extract_sonarqube_steps(stage_body)
-    docker_steps = extract_docker_steps(stage_body)
-    kubectl_commands = extract_kubectl_steps(stage_body)
-    input_steps = extract_input_steps(stage_body)
-    credentials = extract_credentials_usage(stage_body)
-    basic_commands = extract_steps_commands(stage_body)
+    # Extract enhanced features (reuse the caller's analysis when provided)
+    if analysis is None:
+        analysis = analyze_stage(stage_body)
+    tools = analysis.tools
+    git_steps = analysis.git_steps
+    sonar_steps = analysis.sonar_steps
+    docker_steps = analysis.docker_steps
+    kubectl_commands = analysis.kubectl_commands
+    credentials = analysis.credentials
+    basic_commands = analysis.commands
     
     action_def = {
         "name": f"{stage_name} Action",
@@ -234,146 +270,150 @@ def generate_enhanced_composite_action(stage_name: str, stage_body: str, stage_e
     
     # Add environment variables as inputs
     for env_key, env_val in stage_env.items():
-        input_key = env_key.lower().replace('_', '-')
-        action_def["inputs"][input_key] = {
+        action_def["inputs"][env_input_name(env_key)] = {
             "description": f"Environment variable {env_key}",
             "required": False,
             "default": env_val
         }
     
-    steps = []
-    
     # Add tool setup steps
     tool_steps = generate_tool_setup_steps(tools)
-    steps.extend(tool_steps)
     
     # Add git checkout steps (if any, otherwise regular checkout will be added by job)
-    if git_steps:
-        git_actions = convert_git_steps_to_actions(git_steps)
-        steps.extend(git_actions)
+    git_actions = convert_git_steps_to_actions(git_steps) if git_steps else []
     
     # Add SonarQube steps
-    if sonar_steps:
-        sonar_actions = convert_sonarqube_steps(sonar_steps)
-        steps.extend(sonar_actions)
+    sonar_actions = convert_sonarqube_steps(sonar_steps) if sonar_steps else []
     
     # Add Docker steps
-    if docker_steps:
-        docker_actions = convert_docker_steps(docker_steps)
-        steps.extend(docker_actions)
+    docker_actions = convert_docker_steps(docker_steps) if docker_steps else []
     
     # Add basic shell commands (filtered to avoid duplicates with specialized steps)
-    filtered_commands = []
-    for cmd in basic_commands:
-        # Skip commands that are handled by specialized steps
-        if not any([
-            cmd.startswith("git "),
-            "withSonarQubeEnv" in cmd,
-            cmd.startswith("docker build"),
-            cmd.startswith("docker push"),
-            "mvn sonar:sonar" in cmd and sonar_steps  # Only skip if we have sonar steps
-        ]):
-            filtered_commands.append(cmd)
+    # Skip commands that are handled by specialized steps; "mvn sonar:sonar"
+    # is only skipped if we have sonar steps
+    filtered_commands = [
+        cmd for cmd in basic_commands
+        if not (_SKIP_CMD_RE.search(cmd) or (sonar_steps and "mvn sonar:sonar" in cmd))
+    ]
     
-    for i, cmd in enumerate(filtered_commands):
-        step = {
+    # Same env mapping for every command; copied per step so YAML doesn't emit aliases
+    cmd_env = {k: f"${{{{ inputs.{env_input_name(k)} }}}}" for k in stage_env.keys()}
+    cmd_steps = [
+        {
             "name": f"Run command {i+1}",
             "run": cmd,
-            "shell": "bash"
+            "shell": "bash",
+            **({"env": dict(cmd_env)} if cmd_env else {})
         }
-        if stage_env:
-            step["env"] = {k: f"${{{{ inputs.{k.lower().replace('_', '-')} }}}}" for k in stage_env.keys()}
-        steps.append(step)
+        for i, cmd in enumerate(filtered_commands)
+    ]
     
     # Add kubectl commands
-    for kubectl_cmd in kubectl_commands:
-        steps.append({
+    kubectl_steps = [
+        {
             "name": "Run kubectl command",
             "run": kubectl_cmd,
             "shell": "bash"
-        })
+        }
+        for kubectl_cmd in kubectl_commands
+    ]
     
     # Add SSH steps if credentials detected
-    ssh_credentials = [cred for cred in credentials if 'ssh' in cred.lower()]
-    if ssh_credentials:
-        for ssh_cred in ssh_credentials:
-            steps.append({
-                "name": "Execute SSH commands",
-                "uses": "appleboy/ssh-action@v0.1.5",
-                "with": {
-                    "host": "${{ secrets.SSH_HOST }}",
-                    "username": "${{ secrets.SSH_USER }}",
-                    "key": f"${{{{ secrets.{ssh_cred.upper().replace('-', '_')} }}}}"
-                }
-            })
+    ssh_steps = [
+        {
+            "name": "Execute SSH commands",
+            "uses": "appleboy/ssh-action@v0.1.5",
+            "with": {
+                "host": "${{ secrets.SSH_HOST }}",
+                "username": "${{ secrets.SSH_USER }}",
+                "key": f"${{{{ secrets.{secret_name(ssh_cred)} }}}}"
+            }
+        }
+        for ssh_cred in credentials if 'ssh' in ssh_cred.lower()
+    ]
     
     # Add post steps
-    for kind in ("always", "success", "failure"):
-        if kind in post_info:
-            pdata = post_info[kind]
-            if "archive" in pdata:
-                steps.append({
-                    "name": f"Upload artifacts ({kind})",
-                    "if": f"{kind}()",
-                    "uses": "actions/upload-artifact@v4",
-                    "with": {
-                        "name": f"{sanitize_name(stage_name)}-{kind}-artifacts",
-                        "path": pdata["archive"]
-                    }
-                })
-            if "commands" in pdata:
-                for cmd in pdata["commands"]:
-                    steps.append({
-                        "name": f"Post {kind}",
-                        "if": f"{kind}()",
-                        "run": cmd,
-                        "shell": "bash"
-                    })
+    post_steps = generate_post_steps(stage_name, post_info)
+    
+    steps = list(itertools.chain(
+        tool_steps, git_actions, sonar_actions, docker_actions,
+        cmd_steps, kubectl_steps, ssh_steps, post_steps
+    ))
     
     action_def["runs"]["steps"] = steps
     return action_def
 
 
-def save_enhanced_composite_actions(stages_info: List[Dict[str, Any]], output_dir: Path) -> List[Dict[str, Any]]:
-    """Save enhanced composite actions and return metadata"""
+def _load_yaml() -> None:
+    """Import PyYAML on first use and pick the libyaml safe dumper when available"""
+    global _yaml, _YamlDumper
+    if _yaml is not None:
+        return
+    import yaml
+    try:
+        from yaml import CSafeDumper as dumper
+    except ImportError:
+        from yaml import SafeDumper as dumper
+    _yaml, _YamlDumper = yaml, dumper
+
+
+def _dump_one(action_file: Path, action_def: Dict[str, Any]) -> None:
+    """Write a single composite action definition to its action.yml"""
+    action_file.parent.mkdir(parents=True, exist_ok=True)
+    with action_file.open("w", encoding="utf-8") as f:
+        _yaml.dump(action_def, f, Dumper=_YamlDumper, sort_keys=False, width=1000)
+
+
+def save_enhanced_composite_actions(stages_info: List[Dict[str, Any]], output_dir: Path,
+                                    analyses: Optional[List[StageAnalysis]] = None) -> List[Dict[str, Any]]:
+    """
+    Save enhanced composite actions and return metadata
+    analyses, when given, holds the precomputed StageAnalysis for each entry of stages_info
+    """
     actions_dir = output_dir / ".github" / "actions"
     actions_dir.mkdir(parents=True, exist_ok=True)
     
     action_paths = []
+    # action.yml path -> definition; a later stage with the same sanitized name wins
+    pending: Dict[Path, Dict[str, Any]] = {}
     
-    for stage_info in stages_info:
+    for idx, stage_info in enumerate(stages_info):
         stage_name = stage_info["name"]
         stage_body = stage_info.get("body", "")
         action_name = sanitize_name(stage_name.lower())
-        action_dir = actions_dir / action_name
-        action_dir.mkdir(exist_ok=True)
+        analysis = analyses[idx] if analyses is not None else analyze_stage(stage_body)
         
         action_def = generate_enhanced_composite_action(
             stage_name,
             stage_body,
             stage_info.get("env", {}),
             stage_info.get("agent", {}),
-            stage_info.get("post", {})
+            stage_info.get("post", {}),
+            analysis
         )
         
-        action_file = action_dir / "action.yml"
-        with action_file.open("w", encoding="utf-8") as f:
-            yaml.dump(action_def, f, sort_keys=False, width=1000)
+        pending[actions_dir / action_name / "action.yml"] = action_def
         
         relative_path = f"./.github/actions/{action_name}"
         
         # Extract additional metadata for job creation
-        input_steps = extract_input_steps(stage_body)
-        approval_env = convert_input_steps_to_environment(input_steps, stage_name)
-        credentials = extract_credentials_usage(stage_body)
+        approval_env = convert_input_steps_to_environment(analysis.input_steps, stage_name)
         
         action_paths.append({
             "name": stage_name,
             "path": relative_path,
-            "env": stage_info.get("env", {}),
+            "env": dict(stage_info.get("env", {})),
             "approval_environment": approval_env,
-            "credentials": list(credentials),
-            "has_docker": bool(extract_docker_steps(stage_body)),
-            "has_kubectl": bool(extract_kubectl_steps(stage_body))
+            "credentials": list(analysis.credentials),
+            "has_docker": bool(analysis.docker_steps),
+            "has_kubectl": bool(analysis.kubectl_commands),
+            "git_steps": len(analysis.git_steps),
+            "sonar_steps": len(analysis.sonar_steps)
         })
+    
+    # Write the action files concurrently; list() re-raises any write error
+    if pending:
+        _load_yaml()
+        with ThreadPoolExecutor(max_workers=min(8, len(pending))) as pool:
+            list(pool.map(_dump_one, pending.keys(), pending.values()))
     return action_paths
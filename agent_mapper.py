@@ -2,11 +2,20 @@
 Agent label to GitHub Actions runner mapping
 """
 
+import functools
 from typing import Any
 
 
 def map_label_to_runs_on(label: str) -> Any:
     """Enhanced label mapping for Jenkins agent labels to GitHub Actions runners"""
+    runs_on = _map_label(label)
+    # Hand out a fresh list per job so YAML doesn't emit anchors/aliases for shared objects
+    return list(runs_on) if isinstance(runs_on, tuple) else runs_on
+
+
+@functools.lru_cache(maxsize=128)
+def _map_label(label: str) -> Any:
+    """Cached label mapping; self-hosted runners are returned as an immutable tuple"""
     normalized = label.strip().lower()
     
     # GitHub-hosted runners
@@ -34,7 +43,7 @@ def map_label_to_runs_on(label: str) -> Any:
         return "ubuntu-latest"  # Docker needs Linux
     
     # Self-hosted fallback
-    return ["self-hosted", label]
+    return ("self-hosted", label)
 
 
 
@@ -3,23 +3,46 @@
 # Core conversion logic
 # """
 
-import re
-import yaml
+import functools
 from pathlib import Path
 from typing import List, Dict, Any, Tuple, Optional, Set
 
 from utils import (
-    strip_comments, find_block, sanitize_name, gha_job_id
+    strip_comments, find_block, find_top_block, sanitize_name, gha_job_id, env_input_name
 )
 from jenkins_extractors import (
     extract_parameters, extract_global_agent, extract_env_kv,
-    split_stages, extract_stage_when_branch, extract_stage_environment,
-    extract_steps_commands, extract_stage_post, extract_pipeline_post,
-    extract_parallel, extract_stage_agent
+    split_stages, extract_pipeline_post, extract_parallel,
+    StageAnalysis, analyze_stage
 )
 from action_generator import save_enhanced_composite_actions
 from agent_mapper import map_label_to_runs_on
 
+# Extra workflow_dispatch input fields per Jenkins parameter type
+_PARAM_EXTRA = {
+    "string": lambda p: {},
+    "boolean": lambda p: {},
+    "choice": lambda p: {"options": p["options"]},
+}
+
+
+@functools.lru_cache(maxsize=256)
+def _env_input_mapping(keys: Tuple[str, ...]) -> Dict[str, str]:
+    """Map env keys to composite action inputs; the cached dict is shared, copy before use"""
+    return {env_input_name(k): f"${{{{ env.{k} }}}}" for k in keys}
+
+
+def _job_copy(value: Any) -> Any:
+    """
+    Shallow-copy a workflow-level default before placing it in a job
+    Sharing one list/dict object between jobs makes PyYAML emit &id anchors and *id aliases
+    """
+    if isinstance(value, list):
+        return list(value)
+    if isinstance(value, dict):
+        return dict(value)
+    return value
+
 
 def convert_jenkins_to_gha(jenkins_text: str, output_dir: Path = Path(".")) -> Tuple[Dict[str, Any], List[Dict[str, Any]]]:
     """
@@ -39,11 +62,11 @@ def convert_jenkins_to_gha(jenkins_text: str, output_dir: Path = Path(".")) -> T
     parameters = extract_parameters(pipeline_body)
     
     # Global environment
-    es, ee = find_block(pipeline_body, r"\benvironment\b")
+    es, ee = find_top_block(pipeline_body, "environment")
     global_env = extract_env_kv(pipeline_body[es:ee]) if es != -1 else {}
 
     # Stages
-    ss, se = find_block(pipeline_body, r"\bstages\b")
+    ss, se = find_top_block(pipeline_body, "stages")
     if ss == -1:
         raise ValueError("No 'stages { ... }' found.")
     stages_list = split_stages(pipeline_body[ss:se])
@@ -66,32 +89,18 @@ def convert_jenkins_to_gha(jenkins_text: str, output_dir: Path = Path(".")) -> T
                 default_container["options"] = global_agent["args"]
 
     # Build workflow inputs from parameters
-    workflow_inputs = {}
+    workflow_inputs = {
+        param_name: {
+            "description": param_info["description"] or f"Parameter {param_name}",
+            "required": False,
+            "default": param_info["default"],
+            "type": param_info["type"],
+            **_PARAM_EXTRA[param_info["type"]](param_info)
+        }
+        for param_name, param_info in parameters.items()
+        if param_info["type"] in _PARAM_EXTRA
+    }
     workflow_env = dict(global_env)
-    
-    for param_name, param_info in parameters.items():
-        if param_info["type"] == "string":
-            workflow_inputs[param_name] = {
-                "description": param_info["description"] or f"Parameter {param_name}",
-                "required": False,
-                "default": param_info["default"],
-                "type": "string"
-            }
-        elif param_info["type"] == "boolean":
-            workflow_inputs[param_name] = {
-                "description": param_info["description"] or f"Parameter {param_name}",
-                "required": False,
-                "default": param_info["default"],
-                "type": "boolean"
-            }
-        elif param_info["type"] == "choice":
-            workflow_inputs[param_name] = {
-                "description": param_info["description"] or f"Parameter {param_name}",
-                "required": False,
-                "default": param_info["default"],
-                "type": "choice",
-                "options": param_info["options"]
-            }
 
     # Base GHA structure
     gha: Dict[str, Any] = {
@@ -114,6 +123,7 @@ def convert_jenkins_to_gha(jenkins_text: str, output_dir: Path = Path(".")) -> T
 
     # Collect stage information for enhanced composite actions
     stages_info = []
+    analyses: List[StageAnalysis] = []
     last_job_ids: List[str] = []
     prev_job_id: str = ""
 
@@ -122,19 +132,20 @@ def convert_jenkins_to_gha(jenkins_text: str, output_dir: Path = Path(".")) -> T
         if not stage_env:
             return {}
         if not global_env:
-            return stage_env
-        out: Dict[str, str] = {}
-        for k, v in stage_env.items():
-            if k not in global_env or str(global_env[k]) != str(v):
-                out[k] = v
-        return out
+            # Copy: the job env must not alias the stage env returned in action_paths
+            return dict(stage_env)
+        # Env values are always strings (extract_env_kv), so compare them directly
+        keep = stage_env.keys() - global_env.keys()
+        keep |= {k for k in stage_env.keys() & global_env.keys() if stage_env[k] != global_env[k]}
+        # Filter in stage order so the emitted env keeps the Jenkinsfile ordering
+        return {k: v for k, v in stage_env.items() if k in keep}
 
     def apply_agent_to_job(job_def: Dict[str, Any], stage_agent: Dict[str, Any]):
         """Apply agent configuration to job definition with proper ordering"""
         if not stage_agent:
-            job_def["runs-on"] = default_runs_on
+            job_def["runs-on"] = _job_copy(default_runs_on)
             if default_container:
-                job_def["container"] = dict(default_container)
+                job_def["container"] = _job_copy(default_container)
             return
             
         if stage_agent["type"] == "any":
@@ -149,25 +160,18 @@ def convert_jenkins_to_gha(jenkins_text: str, output_dir: Path = Path(".")) -> T
 
     def create_enhanced_job_steps(action_info: Dict[str, Any]) -> List[Dict[str, Any]]:
         """Create enhanced job steps with better checkout handling"""
-        steps = []
-        
         # Add checkout only if the action doesn't handle git steps itself
-        if not any("git" in str(cred).lower() for cred in action_info.get("credentials", [])):
-            steps.append({"uses": "actions/checkout@v4"})
+        needs_checkout = not any("git" in str(cred).lower() for cred in action_info.get("credentials", []))
         
-        # Add composite action step
+        # Add composite action step, with inputs for environment variables
+        stage_env = action_info.get("env", {})
         step = {
             "name": f"Run {action_info['name']}",
-            "uses": action_info["path"]
+            "uses": action_info["path"],
+            **({"with": dict(_env_input_mapping(tuple(stage_env)))} if stage_env else {})
         }
         
-        # Add inputs for environment variables
-        stage_env = action_info.get("env", {})
-        if stage_env:
-            step["with"] = {k.lower().replace('_', '-'): f"${{{{ env.{k} }}}}" for k in stage_env.keys()}
-        
-        steps.append(step)
-        return steps
+        return [{"uses": "actions/checkout@v4"}, step] if needs_checkout else [step]
 
     # Process stages with enhanced features
     for stage in stages_list:
@@ -186,14 +190,16 @@ def convert_jenkins_to_gha(jenkins_text: str, output_dir: Path = Path(".")) -> T
                 job_id = gha_job_id(sub_name)
                 parallel_ids.append(job_id)
 
-                stage_agent = extract_stage_agent(sub_body)
-                stage_env_raw = extract_stage_environment(sub_body)
+                analysis = analyze_stage(sub_body)
+                stage_agent = analysis.agent
+                stage_env_raw = analysis.environment
                 job_env = compute_job_env(stage_env_raw)
-                branch = extract_stage_when_branch(sub_body)
+                branch = analysis.when_branch
                 if_cond = f"github.ref == 'refs/heads/{branch}'" if branch else None
-                post_info = extract_stage_post(sub_body)
+                post_info = analysis.post
 
                 # Add to stages info for enhanced composite action generation
+                analyses.append(analysis)
                 stages_info.append({
                     "name": sub_name,
                     "body": sub_body,  # Include full body for enhanced parsing
@@ -205,16 +211,14 @@ def convert_jenkins_to_gha(jenkins_text: str, output_dir: Path = Path(".")) -> T
                 # Create job definition with proper ordering
                 job_def: Dict[str, Any] = {}
                 apply_agent_to_job(job_def, stage_agent)
-                
-                if job_env:
-                    job_def["env"] = job_env
-                if if_cond:
-                    job_def["if"] = if_cond
-                if upstream:
-                    job_def["needs"] = upstream
-                
-                # Placeholder steps - will be updated after composite actions are created
-                job_def["steps"] = [{"uses": "actions/checkout@v4"}]
+                job_def = {
+                    **job_def,
+                    **({"env": job_env} if job_env else {}),
+                    **({"if": if_cond} if if_cond else {}),
+                    **({"needs": upstream} if upstream else {}),
+                    # Placeholder steps - will be updated after composite actions are created
+                    "steps": [{"uses": "actions/checkout@v4"}],
+                }
                 
                 gha["jobs"][job_id] = job_def
 
@@ -224,14 +228,16 @@ def convert_jenkins_to_gha(jenkins_text: str, output_dir: Path = Path(".")) -> T
 
         # Handle sequential stages
         job_id = gha_job_id(stage_name)
-        stage_agent = extract_stage_agent(stage_body)
-        stage_env_raw = extract_stage_environment(stage_body)
+        analysis = analyze_stage(stage_body)
+        stage_agent = analysis.agent
+        stage_env_raw = analysis.environment
         job_env = compute_job_env(stage_env_raw)
-        branch = extract_stage_when_branch(stage_body)
+        branch = analysis.when_branch
         if_cond = f"github.ref == 'refs/heads/{branch}'" if branch else None
-        post_info = extract_stage_post(stage_body)
+        post_info = analysis.post
 
         # Add to stages info for enhanced composite action generation
+        analyses.append(analysis)
         stages_info.append({
             "name": stage_name,
             "body": stage_body,  # Include full body for enhanced parsing
@@ -240,29 +246,27 @@ def convert_jenkins_to_gha(jenkins_text: str, output_dir: Path = Path(".")) -> T
             "post": post_info
         })
 
+        # Depend on the preceding parallel group if there was one, else the previous stage
+        needs: Any = last_job_ids or prev_job_id
+        last_job_ids = []
+
         # Create job definition with proper ordering
         job_def: Dict[str, Any] = {}
         apply_agent_to_job(job_def, stage_agent)
-        
-        if job_env:
-            job_def["env"] = job_env
-        if if_cond:
-            job_def["if"] = if_cond
-
-        if last_job_ids:
-            job_def["needs"] = last_job_ids
-            last_job_ids = []
-        elif prev_job_id:
-            job_def["needs"] = prev_job_id
-
-        # Placeholder steps - will be updated after composite actions are created
-        job_def["steps"] = [{"uses": "actions/checkout@v4"}]
+        job_def = {
+            **job_def,
+            **({"env": job_env} if job_env else {}),
+            **({"if": if_cond} if if_cond else {}),
+            **({"needs": needs} if needs else {}),
+            # Placeholder steps - will be updated after composite actions are created
+            "steps": [{"uses": "actions/checkout@v4"}],
+        }
         
         gha["jobs"][job_id] = job_def
         prev_job_id = job_id
 
     # Generate enhanced composite actions
-    action_paths = save_enhanced_composite_actions(stages_info, output_dir)
+    action_paths = save_enhanced_composite_actions(stages_info, output_dir, analyses)
     # print(action_paths)
     # Update job steps to use enhanced composite actions
     job_keys = list(gha["jobs"].keys())
@@ -322,13 +326,13 @@ def convert_jenkins_to_gha(jenkins_text: str, output_dir: Path = Path(".")) -> T
             all_jobs = [k for k in gha["jobs"].keys() if k != "pipeline-post"]
             post_job_def = {
                 "name": "Pipeline Post",
-                "runs-on": default_runs_on,
+                "runs-on": _job_copy(default_runs_on),
                 "needs": all_jobs,
                 "if": "always()",
                 "steps": post_job_steps
             }
             if default_container:
-                post_job_def["container"] = dict(default_container)
+                post_job_def["container"] = _job_copy(default_container)
             gha["jobs"]["pipeline-post"] = post_job_def
 
     return gha, action_paths
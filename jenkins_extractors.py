@@ -2,85 +2,167 @@
 Jenkins pipeline parsing and feature extraction functions
 """
 
+import copy
+import functools
 import re
-from typing import List, Dict, Any, Set
-from utils import find_block, multiline_to_commands, strip_comments
-
-
+from dataclasses import dataclass
+from typing import List, Dict, Any
+from utils import find_top_block, multiline_to_commands, strip_comments, tokenize_braces
+
+
+def _stage_cache(fn):
+    """
+    Memoize a per-stage extractor, which is a pure function of the body string
+    Each call returns a deep copy of the cached value, so callers may mutate their result
+    without changing what later calls (or later conversions) see
+    """
+    cached = functools.lru_cache(maxsize=512)(fn)
+
+    @functools.wraps(fn)
+    def wrapper(stage_body: str):
+        return copy.deepcopy(cached(stage_body))
+
+    wrapper.cache_info = cached.cache_info
+    wrapper.cache_clear = cached.cache_clear
+    return wrapper
+
+
+# tools { ... }
+_TOOL_RES = {
+    "maven": re.compile(r"maven\s+['\"]([^'\"]+)['\"]"),
+    "jdk": re.compile(r"jdk\s+['\"]([^'\"]+)['\"]"),
+    "nodejs": re.compile(r"nodejs\s+['\"]([^'\"]+)['\"]"),
+    "git": re.compile(r"git\s+['\"]([^'\"]+)['\"]"),
+}
+
+# Steps
+# git / withSonarQubeEnv calls: locate the argument list, then read key: 'value' pairs from it
+# in any order. A bare git call may continue onto the next line after a trailing comma.
+_GIT_ARGS = r"""(?:'[^'\n]*'|"[^"\n]*"|[^'"\n{}])*"""
+_GIT_CALL_RE = re.compile(rf"\bgit\b\s*(?:\(([^)]*)\)|((?:{_GIT_ARGS},[ \t]*\n)*{_GIT_ARGS}))")
+# Only the head is matched; the block body comes from tokenize_braces so ${...} inside survives
+_SONAR_BLOCK_RE = re.compile(r"withSonarQubeEnv\s*\(([^)]*)\)\s*\{")
+_KWARG_RE = re.compile(r"\b(\w+)\s*:\s*['\"]([^'\"]*)['\"]")
+_POSITIONAL_STR_RE = re.compile(r"\s*['\"]([^'\"]*)['\"]")
+_INPUT_RE = re.compile(r"input\s*\(\s*message\s*:\s*['\"]([^'\"]+)['\"](?:\s*,\s*parameters\s*:\s*\[([^\]]*)\])?\s*\)")
+_DOCKER_BUILD_RE = re.compile(r"docker\s+build\s+(?:-t\s+)?([^\s]+)(?:\s+(.+))?")
+_DOCKER_PUSH_RE = re.compile(r"docker\s+push\s+([^\s]+)")
+_KUBECTL_RE = re.compile(r"kubectl\s+([^\n\"']+)")
+_SH_RE = re.compile(r"sh\s+['\"]([^'\"]+)['\"]")
+# Triple-quoted sh, single-line sh, echo, archiveArtifacts and mail to in one scan.
+# The triple-quoted alternative must come before the single-quoted one.
+_STEP_RE = re.compile(
+    r"(?P<sh3>sh\s+(?P<q>[\"']{3})(?P<body3>[\s\S]*?)(?P=q))"
+    r"|(?P<sh1>sh\s+['\"](?P<body1>[^'\"]+)['\"])"
+    r"|(?P<echo>\becho\s+['\"](?P<ebody>[^'\"]+)['\"])"
+    r"|(?P<arch>archiveArtifacts\s*\(\s*artifacts\s*:\s*['\"](?P<aval>[^'\"]+)['\"])"
+    r"|(?P<mail>mail\s+to\s*:\s*['\"](?P<mval>[^'\"]+)['\"])"
+)
+
+# Credentials
+# credentialsId: '...' | credentials('...') | sshagent(['...', ...])
+_CRED_RE = re.compile(
+    r"credentialsId\s*:\s*['\"]([^'\"]+)['\"]"
+    r"|credentials\s*\(\s*['\"]([^'\"]+)['\"]\s*\)"
+    r"|sshagent\s*\(\s*\[([^\]]+)\]\s*\)"
+)
+_SSH_ITEM_RE = re.compile(r"['\"]([^'\"]+)['\"]")
+
+# parameters { ... }
+_PARAM_STRING_RE = re.compile(r"string\s*\(\s*name\s*:\s*['\"]([^'\"]+)['\"](?:,\s*defaultValue\s*:\s*['\"]([^'\"]*)['\"])?(?:,\s*description\s*:\s*['\"]([^'\"]*)['\"])?")
+_PARAM_BOOL_RE = re.compile(r"booleanParam\s*\(\s*name\s*:\s*['\"]([^'\"]+)['\"](?:,\s*defaultValue\s*:\s*(true|false))?(?:,\s*description\s*:\s*['\"]([^'\"]*)['\"])?")
+_PARAM_CHOICE_RE = re.compile(r"choice\s*\(\s*name\s*:\s*['\"]([^'\"]+)['\"](?:,\s*choices\s*:\s*\[([^\]]+)\])?(?:,\s*description\s*:\s*['\"]([^'\"]*)['\"])?")
+
+# agent { ... }
+_ANY_RE = re.compile(r"\bany\b")
+_LABEL_RE = re.compile(r"label\s+['\"]([^'\"]+)['\"]")
+_IMAGE_RE = re.compile(r"image\s+['\"]([^'\"]+)['\"]")
+_ARGS_RE = re.compile(r"args\s+['\"]([^'\"]+)['\"]")
+_REUSE_NODE_RE = re.compile(r"reuseNode\s+(true|false)")
+
+# Stage structure
+_ENV_KV_RE = re.compile(r"^[ \t]*([A-Za-z_][A-Za-z0-9_]*)[ \t]*=[ \t]*(.*\S)", re.MULTILINE)
+_STAGE_HEAD_RE = re.compile(r"stage\s*\(\s*['\"]([^'\"]+)['\"]\s*\)\s*\{")
+_BRANCH_RE = re.compile(r"branch\s+['\"]([^'\"]+)['\"]")
+
+
+@_stage_cache
 def extract_tools(stage_body: str) -> Dict[str, str]:
     """Extract tools block from stage"""
     tools = {}
-    s, e = find_block(stage_body, r"\btools\b")
+    s, e = find_top_block(stage_body, "tools")
     if s == -1:
         return tools
     
     tools_body = stage_body[s:e]
     
-    # Maven tools
-    m = re.search(r"maven\s+['\"]([^'\"]+)['\"]", tools_body)
-    if m:
-        tools["maven"] = m.group(1)
-    
-    # JDK tools
-    m = re.search(r"jdk\s+['\"]([^'\"]+)['\"]", tools_body)
-    if m:
-        tools["jdk"] = m.group(1)
-    
-    # Node.js tools
-    m = re.search(r"nodejs\s+['\"]([^'\"]+)['\"]", tools_body)
-    if m:
-        tools["nodejs"] = m.group(1)
-    
-    # Git tools
-    m = re.search(r"git\s+['\"]([^'\"]+)['\"]", tools_body)
-    if m:
-        tools["git"] = m.group(1)
+    # maven / jdk / nodejs / git tools
+    for tool, pattern in _TOOL_RES.items():
+        m = pattern.search(tools_body)
+        if m:
+            tools[tool] = m.group(1)
         
     return tools
 
 
+# Private and only read by the extractors below, so the cached dict is shared, not copied
+@functools.lru_cache(maxsize=512)
+def _parse_kwargs(args: str) -> Dict[str, str]:
+    """Parse key: 'value' pairs from a Groovy argument list; the first occurrence of a key wins"""
+    kwargs: Dict[str, str] = {}
+    for m in _KWARG_RE.finditer(args):
+        kwargs.setdefault(m.group(1), m.group(2))
+    return kwargs
+
+
+@_stage_cache
 def extract_git_steps(stage_body: str) -> List[Dict[str, Any]]:
     """Extract git checkout steps"""
+    if "git" not in stage_body:
+        return []
     git_steps = []
     
-    # git branch: "...", url: "...", credentialsId: "..."
-    pattern = r"git\s+(?:branch\s*:\s*['\"]([^'\"]*)['\"](?:\s*,)?)?\s*(?:url\s*:\s*['\"]([^'\"]+)['\"](?:\s*,)?)?\s*(?:credentialsId\s*:\s*['\"]([^'\"]*)['\"])?"
-    
-    for m in re.finditer(pattern, stage_body):
-        branch = m.group(1) or ""
-        url = m.group(2) or ""
-        credentials_id = m.group(3) or ""
+    # git branch: "...", url: "...", credentialsId: "..." (any order, optional parentheses)
+    for m in _GIT_CALL_RE.finditer(stage_body):
+        kwargs = _parse_kwargs(m.group(1) or m.group(2) or "")
         
-        if url:  # Only add if we have a URL
+        if kwargs.get("url"):  # Only add if we have a URL
             git_steps.append({
-                "branch": branch,
-                "url": url,
-                "credentialsId": credentials_id
+                "branch": kwargs.get("branch", ""),
+                "url": kwargs["url"],
+                "credentialsId": kwargs.get("credentialsId", "")
             })
     
     return git_steps
 
 
+@_stage_cache
 def extract_sonarqube_steps(stage_body: str) -> List[Dict[str, Any]]:
     """Extract SonarQube steps"""
+    if "withSonarQubeEnv" not in stage_body:
+        return []
     sonar_steps = []
-    
-    # withSonarQubeEnv pattern
-    pattern = r"withSonarQubeEnv\s*\(\s*(?:credentialsId\s*:\s*['\"]([^'\"]*)['\"])?(?:\s*,)?\s*(?:installationName\s*:\s*['\"]([^'\"]*)['\"])?\s*\)\s*\{([^}]*)\}"
-    
-    for m in re.finditer(pattern, stage_body, re.DOTALL):
-        credentials_id = m.group(1) or ""
-        installation_name = m.group(2) or ""
-        inner_commands = m.group(3) or ""
+    braces = tokenize_braces(stage_body)
+    
+    # withSonarQubeEnv('name') / withSonarQubeEnv(credentialsId: '...', installationName: '...')
+    for m in _SONAR_BLOCK_RE.finditer(stage_body):
+        args = m.group(1)
+        kwargs = _parse_kwargs(args)
+        positional = _POSITIONAL_STR_RE.match(args)
+        installation_name = kwargs.get("installationName") or (positional.group(1) if positional else "")
+        end = braces.get(m.end() - 1)
+        if end is None:
+            continue
+        inner_commands = stage_body[m.end():end]
         
         # Extract commands from within the block
         commands = []
-        for cmd_match in re.finditer(r"sh\s+['\"]([^'\"]+)['\"]", inner_commands):
+        for cmd_match in _SH_RE.finditer(inner_commands):
             commands.append(cmd_match.group(1))
         
         if commands:
             sonar_steps.append({
-                "credentialsId": credentials_id,
+                "credentialsId": kwargs.get("credentialsId", ""),
                 "installationName": installation_name,
                 "commands": commands
             })
@@ -88,14 +170,15 @@ def extract_sonarqube_steps(stage_body: str) -> List[Dict[str, Any]]:
     return sonar_steps
 
 
+@_stage_cache
 def extract_input_steps(stage_body: str) -> List[Dict[str, Any]]:
     """Extract input approval steps"""
+    if "input" not in stage_body:
+        return []
     input_steps = []
     
     # input(message: "...", parameters: [...])
-    pattern = r"input\s*\(\s*message\s*:\s*['\"]([^'\"]+)['\"](?:\s*,\s*parameters\s*:\s*\[([^\]]*)\])?\s*\)"
-    
-    for m in re.finditer(pattern, stage_body):
+    for m in _INPUT_RE.finditer(stage_body):
         message = m.group(1)
         parameters_str = m.group(2) or ""
         
@@ -107,34 +190,33 @@ def extract_input_steps(stage_body: str) -> List[Dict[str, Any]]:
     return input_steps
 
 
-def extract_credentials_usage(stage_body: str) -> Set[str]:
-    """Extract credential IDs used in the stage"""
-    credentials = set()
-    
-    # credentialsId: "..."
-    for m in re.finditer(r"credentialsId\s*:\s*['\"]([^'\"]+)['\"]", stage_body):
-        credentials.add(m.group(1))
-    
-    # credentials("...")
-    for m in re.finditer(r"credentials\s*\(\s*['\"]([^'\"]+)['\"]\s*\)", stage_body):
-        credentials.add(m.group(1))
+@_stage_cache
+def extract_credentials_usage(stage_body: str) -> List[str]:
+    """Extract credential IDs used in the stage, deduplicated in first-seen order"""
+    if "credentials" not in stage_body and "sshagent" not in stage_body:
+        return []
+    # dict as an insertion-ordered set, so the order never depends on the hash seed
+    credentials: Dict[str, None] = {}
     
-    # sshagent ([...])
-    for m in re.finditer(r"sshagent\s*\(\s*\[([^\]]+)\]\s*\)", stage_body):
-        cred_list = m.group(1)
-        for cred in re.findall(r"['\"]?([^'\"]+)['\"]?", cred_list):
-            if cred.strip():
-                credentials.add(cred.strip())
+    for m in _CRED_RE.finditer(stage_body):
+        if m.group(3) is not None:
+            # sshagent ([...]): only the quoted items are credential IDs
+            credentials.update(dict.fromkeys(filter(None, map(str.strip, _SSH_ITEM_RE.findall(m.group(3))))))
+        else:
+            credentials[m.group(1) or m.group(2)] = None
     
-    return credentials
+    return list(credentials)
 
 
+@_stage_cache
 def extract_docker_steps(stage_body: str) -> List[Dict[str, Any]]:
     """Extract Docker-related steps"""
+    if "docker" not in stage_body:
+        return []
     docker_steps = []
     
     # Docker build
-    for m in re.finditer(r"docker\s+build\s+(?:-t\s+)?([^\s]+)(?:\s+(.+))?", stage_body):
+    for m in _DOCKER_BUILD_RE.finditer(stage_body):
         tag = m.group(1).strip()
         context = m.group(2).strip() if m.group(2) else "."
         docker_steps.append({
@@ -144,7 +226,7 @@ def extract_docker_steps(stage_body: str) -> List[Dict[str, Any]]:
         })
     
     # Docker push
-    for m in re.finditer(r"docker\s+push\s+([^\s]+)", stage_body):
+    for m in _DOCKER_PUSH_RE.finditer(stage_body):
         tag = m.group(1).strip()
         docker_steps.append({
             "type": "push",
@@ -154,11 +236,14 @@ def extract_docker_steps(stage_body: str) -> List[Dict[str, Any]]:
     return docker_steps
 
 
+@_stage_cache
 def extract_kubectl_steps(stage_body: str) -> List[str]:
     """Extract kubectl commands"""
+    if "kubectl" not in stage_body:
+        return []
     kubectl_commands = []
     
-    for m in re.finditer(r"kubectl\s+([^\n\"']+)", stage_body):
+    for m in _KUBECTL_RE.finditer(stage_body):
         kubectl_commands.append(f"kubectl {m.group(1).strip()}")
     
     return kubectl_commands
@@ -167,14 +252,14 @@ def extract_kubectl_steps(stage_body: str) -> List[str]:
 def extract_parameters(pipeline_body: str) -> Dict[str, Any]:
     """Extract pipeline parameters with enhanced support"""
     params = {}
-    s, e = find_block(pipeline_body, r"\bparameters\b")
+    s, e = find_top_block(pipeline_body, "parameters")
     if s == -1:
         return params
     
     param_body = pipeline_body[s:e]
     
     # string parameters
-    for m in re.finditer(r"string\s*\(\s*name\s*:\s*['\"]([^'\"]+)['\"](?:,\s*defaultValue\s*:\s*['\"]([^'\"]*)['\"])?(?:,\s*description\s*:\s*['\"]([^'\"]*)['\"])?", param_body):
+    for m in _PARAM_STRING_RE.finditer(param_body):
         name = m.group(1)
         default = m.group(2) or ""
         description = m.group(3) or ""
@@ -185,7 +270,7 @@ def extract_parameters(pipeline_body: str) -> Dict[str, Any]:
         }
     
     # boolean parameters
-    for m in re.finditer(r"booleanParam\s*\(\s*name\s*:\s*['\"]([^'\"]+)['\"](?:,\s*defaultValue\s*:\s*(true|false))?(?:,\s*description\s*:\s*['\"]([^'\"]*)['\"])?", param_body):
+    for m in _PARAM_BOOL_RE.finditer(param_body):
         name = m.group(1)
         default = m.group(2) or "false"
         description = m.group(3) or ""
@@ -196,7 +281,7 @@ def extract_parameters(pipeline_body: str) -> Dict[str, Any]:
         }
     
     # choice parameters
-    for m in re.finditer(r"choice\s*\(\s*name\s*:\s*['\"]([^'\"]+)['\"](?:,\s*choices\s*:\s*\[([^\]]+)\])?(?:,\s*description\s*:\s*['\"]([^'\"]*)['\"])?", param_body):
+    for m in _PARAM_CHOICE_RE.finditer(param_body):
         name = m.group(1)
         choices_str = m.group(2) or ""
         description = m.group(3) or ""
@@ -211,42 +296,34 @@ def extract_parameters(pipeline_body: str) -> Dict[str, Any]:
     return params
 
 
-def extract_global_agent(pipeline_body: str) -> Dict[str, Any]:
-    """Enhanced agent extraction with better parsing"""
-    s, e = find_block(pipeline_body, r"\bagent\b")
-    if s == -1:
-        return {}
-    agent_body = pipeline_body[s:e]
-    
+def _parse_agent_block(body: str) -> Dict[str, Any]:
+    """Parse the content of an 'agent { ... }' block (any, label, node { label }, docker { ... })"""
     # agent any
-    if re.search(r"\bany\b", agent_body):
+    if _ANY_RE.search(body):
         return {"type": "any"}
     
     # agent { node { label '...' } }
-    ns, ne = find_block(agent_body, r"\bnode\b")
+    ns, ne = find_top_block(body, "node")
     if ns != -1:
-        node_body = agent_body[ns:ne]
-        m = re.search(r"label\s+['\"]([^'\"]+)['\"]", node_body)
+        m = _LABEL_RE.search(body, ns, ne)
         if m:
             return {"type": "label", "label": m.group(1).strip()}
     
     # agent { label '...' }
-    m = re.search(r"label\s+['\"]([^'\"]+)['\"]", agent_body)
+    m = _LABEL_RE.search(body)
     if m:
         return {"type": "label", "label": m.group(1).strip()}
     
     # agent { docker { ... } }
-    ds, de = find_block(agent_body, r"\bdocker\b")
+    ds, de = find_top_block(body, "docker")
     if ds != -1:
-        docker_body = agent_body[ds:de]
-        img = re.search(r"image\s+['\"]([^'\"]+)['\"]", docker_body)
-        args = re.search(r"args\s+['\"]([^'\"]+)['\"]", docker_body)
-        reuse_node = re.search(r"reuseNode\s+(true|false)", docker_body)
-        
+        img = _IMAGE_RE.search(body, ds, de)
         if img:
             out = {"type": "docker", "image": img.group(1).strip()}
+            args = _ARGS_RE.search(body, ds, de)
             if args:
                 out["args"] = args.group(1).strip()
+            reuse_node = _REUSE_NODE_RE.search(body, ds, de)
             if reuse_node:
                 out["reuseNode"] = reuse_node.group(1) == "true"
             return out
@@ -254,124 +331,91 @@ def extract_global_agent(pipeline_body: str) -> Dict[str, Any]:
     return {}
 
 
+def extract_global_agent(pipeline_body: str) -> Dict[str, Any]:
+    """Enhanced agent extraction with better parsing"""
+    s, e = find_top_block(pipeline_body, "agent")
+    return _parse_agent_block(pipeline_body[s:e]) if s != -1 else {}
+
+
+@_stage_cache
 def extract_stage_agent(stage_body: str) -> Dict[str, Any]:
     """Enhanced stage agent extraction"""
-    s, e = find_block(stage_body, r"\bagent\b")
-    if s == -1:
-        return {}
-    body = stage_body[s:e]
-    
-    if re.search(r"\bany\b", body):
-        return {"type": "any"}
-    
-    # Handle node { label } syntax
-    ns, ne = find_block(body, r"\bnode\b")
-    if ns != -1:
-        node_body = body[ns:ne]
-        m = re.search(r"label\s+['\"]([^'\"]+)['\"]", node_body)
-        if m:
-            return {"type": "label", "label": m.group(1).strip()}
-    
-    m = re.search(r"label\s+['\"]([^'\"]+)['\"]", body)
-    if m:
-        return {"type": "label", "label": m.group(1).strip()}
-    
-    ds, de = find_block(body, r"\bdocker\b")
-    if ds != -1:
-        dbody = body[ds:de]
-        img = re.search(r"image\s+['\"]([^'\"]+)['\"]", dbody)
-        args = re.search(r"args\s+['\"]([^'\"]+)['\"]", dbody)
-        reuse_node = re.search(r"reuseNode\s+(true|false)", dbody)
-        
-        if img:
-            out = {"type": "docker", "image": img.group(1).strip()}
-            if args:
-                out["args"] = args.group(1).strip()
-            if reuse_node:
-                out["reuseNode"] = reuse_node.group(1) == "true"
-            return out
-    
-    return {}
+    s, e = find_top_block(stage_body, "agent")
+    return _parse_agent_block(stage_body[s:e]) if s != -1 else {}
+
+
+def _unquote(val: str) -> str:
+    """Drop one pair of matching surrounding quotes"""
+    if val[0] == val[-1] and val[0] in "'\"":
+        return val[1:-1]
+    return val
 
 
 def extract_env_kv(env_body: str) -> Dict[str, str]:
     """Extract environment key-value pairs from environment block"""
-    env: Dict[str, str] = {}
-    for line in env_body.splitlines():
-        line = line.strip()
-        if not line or line.startswith("#"):
-            continue
-        m = re.match(r"([A-Za-z_][A-Za-z0-9_]*)\s*=\s*(.+)", line)
-        if m:
-            key = m.group(1)
-            val = m.group(2).strip()
-            if (val.startswith("'") and val.endswith("'")) or (val.startswith('"') and val.endswith('"')):
-                val = val[1:-1]
-            env[key] = val
-    return env
+    return {m.group(1): _unquote(m.group(2)) for m in _ENV_KV_RE.finditer(env_body)}
 
 
 def split_stages(stages_body: str) -> List[Dict[str, Any]]:
     """Split stages block into individual stages"""
     res = []
+    braces = tokenize_braces(stages_body)
     i = 0
     while True:
-        m = re.search(r"stage\s*\(\s*['\"]([^'\"]+)['\"]\s*\)\s*\{", stages_body[i:])
+        m = _STAGE_HEAD_RE.search(stages_body, i)
         if not m:
             break
-        name = m.group(1)
-        abs_start = i + m.start()
-        block_start = abs_start + m.end() - m.start() - 1
-        depth = 0
-        j = block_start + 1
-        content_start = j
-        while j < len(stages_body):
-            if stages_body[j] == '{':
-                depth += 1
-            elif stages_body[j] == '}':
-                if depth == 0:
-                    res.append({"name": name, "content": stages_body[content_start:j]})
-                    i = j + 1
-                    break
-                depth -= 1
-            j += 1
-        else:
+        block_start = m.end() - 1
+        block_end = braces.get(block_start)
+        if block_end is None:
             break
+        res.append({"name": m.group(1), "content": stages_body[block_start + 1:block_end]})
+        i = block_end + 1
     return res
 
 
+@_stage_cache
 def extract_stage_when_branch(stage_body: str) -> str:
     """Extract branch condition from when block"""
-    s, e = find_block(stage_body, r"\bwhen\b")
+    s, e = find_top_block(stage_body, "when")
     if s == -1:
         return ""
     when_body = stage_body[s:e]
-    m = re.search(r"branch\s+['\"]([^'\"]+)['\"]", when_body)
+    m = _BRANCH_RE.search(when_body)
     return m.group(1) if m else ""
 
 
+@_stage_cache
 def extract_stage_environment(stage_body: str) -> Dict[str, str]:
     """Extract environment variables from stage"""
-    s, e = find_block(stage_body, r"\benvironment\b")
+    s, e = find_top_block(stage_body, "environment")
     if s == -1:
         return {}
     return extract_env_kv(stage_body[s:e])
 
 
+def _step_commands(m: "re.Match[str]") -> List[str]:
+    """Commands contributed by a single _STEP_RE match (none for archive/mail matches)"""
+    kind = m.lastgroup
+    if kind == "sh3":
+        return multiline_to_commands(m.group("body3"))
+    if kind == "sh1":
+        return [m.group("body1").strip()]
+    if kind == "echo":
+        return [f"echo {m.group('ebody').strip()}"]
+    return []
+
+
+@_stage_cache
 def extract_steps_commands(stage_body: str) -> List[str]:
     """Extract shell commands from steps block"""
     cmds: List[str] = []
-    s, e = find_block(stage_body, r"\bsteps\b")
+    s, e = find_top_block(stage_body, "steps")
     search_zone = stage_body[s:e] if s != -1 else stage_body
     zone = strip_comments(search_zone)
 
-    for m in re.finditer(r"sh\s+([\"']{3})([\s\S]*?)\1", zone):
-        inner = m.group(2)
-        cmds.extend(multiline_to_commands(inner))
-    for m in re.finditer(r"sh\s+['\"]([^'\"]+)['\"]", zone):
-        cmds.append(m.group(1).strip())
-    for m in re.finditer(r"\becho\s+['\"]([^'\"]+)['\"]", zone):
-        cmds.append(f"echo {m.group(1).strip()}")
+    for m in _STEP_RE.finditer(zone):
+        cmds.extend(_step_commands(m))
 
     return cmds
 
@@ -379,35 +423,30 @@ def extract_steps_commands(stage_body: str) -> List[str]:
 def _extract_post_body(body: str) -> Dict[str, Any]:
     """Extract post block content"""
     out: Dict[str, Any] = {}
-    ps, pe = find_block(body, r"\bpost\b")
+    ps, pe = find_top_block(body, "post")
     if ps == -1:
         return out
     post_body = body[ps:pe]
 
     def _collect(kind: str) -> Dict[str, Any]:
-        ks, ke = find_block(post_body, rf"\b{kind}\b")
+        ks, ke = find_top_block(post_body, kind)
         if ks == -1:
             return {}
         kbody = post_body[ks:ke]
         data: Dict[str, Any] = {}
-        # archiveArtifacts (common)
-        m = re.search(r"archiveArtifacts\s*\(\s*artifacts\s*:\s*['\"]([^'\"]+)['\"]", kbody)
-        if m:
-            data["archive"] = m.group(1).strip()
-        # capture shell/echo inside post
         cmds = []
-        for mm in re.finditer(r"sh\s+['\"]([^'\"]+)['\"]", kbody):
-            cmds.append(mm.group(1).strip())
-        for mm in re.finditer(r"sh\s+([\"']{3})([\s\S]*?)\1", kbody):
-            cmds.extend(multiline_to_commands(mm.group(2)))
-        for mm in re.finditer(r"\becho\s+['\"]([^'\"]+)['\"]", kbody):
-            cmds.append(f"echo {mm.group(1).strip()}")
+        for m in _STEP_RE.finditer(kbody):
+            if m.lastgroup == "arch":
+                # archiveArtifacts (common); the first one wins
+                data.setdefault("archive", m.group("aval").strip())
+            elif m.lastgroup == "mail":
+                # mail to (placeholder); the first one wins
+                data.setdefault("mail_to", m.group("mval").strip())
+            else:
+                # capture shell/echo inside post
+                cmds.extend(_step_commands(m))
         if cmds:
             data["commands"] = cmds
-        # mail to (placeholder)
-        m = re.search(r"mail\s+to\s*:\s*['\"]([^'\"]+)['\"]", kbody)
-        if m:
-            data["mail_to"] = m.group(1).strip()
         return data
 
     for kind in ("always", "success", "failure", "cleanup"):
@@ -417,6 +456,7 @@ def _extract_post_body(body: str) -> Dict[str, Any]:
     return out
 
 
+@_stage_cache
 def extract_stage_post(stage_body: str) -> Dict[str, Any]:
     """Extract post block from stage"""
     return _extract_post_body(stage_body)
@@ -427,13 +467,46 @@ def extract_pipeline_post(pipeline_body: str) -> Dict[str, Any]:
     return _extract_post_body(pipeline_body)
 
 
+@_stage_cache
 def extract_parallel(stage_body: str) -> List[Dict[str, Any]]:
     """Extract parallel stages from stage body"""
-    ps, pe = find_block(stage_body, r"\bparallel\b")
+    ps, pe = find_top_block(stage_body, "parallel")
     if ps == -1:
         return []
     par_body = stage_body[ps:pe]
     return split_stages(par_body)
 
 
-
+@dataclass
+class StageAnalysis:
+    """Everything extracted from a single stage body"""
+    agent: Dict[str, Any]
+    environment: Dict[str, str]
+    when_branch: str
+    post: Dict[str, Any]
+    tools: Dict[str, str]
+    git_steps: List[Dict[str, Any]]
+    sonar_steps: List[Dict[str, Any]]
+    docker_steps: List[Dict[str, Any]]
+    kubectl_commands: List[str]
+    input_steps: List[Dict[str, Any]]
+    credentials: List[str]
+    commands: List[str]
+
+
+def analyze_stage(stage_body: str) -> StageAnalysis:
+    """Run every stage extractor once over stage_body"""
+    return StageAnalysis(
+        agent=extract_stage_agent(stage_body),
+        environment=extract_stage_environment(stage_body),
+        when_branch=extract_stage_when_branch(stage_body),
+        post=extract_stage_post(stage_body),
+        tools=extract_tools(stage_body),
+        git_steps=extract_git_steps(stage_body),
+        sonar_steps=extract_sonarqube_steps(stage_body),
+        docker_steps=extract_docker_steps(stage_body),
+        kubectl_commands=extract_kubectl_steps(stage_body),
+        input_steps=extract_input_steps(stage_body),
+        credentials=extract_credentials_usage(stage_body),
+        commands=extract_steps_commands(stage_body),
+    )
@@ -38,14 +38,18 @@ def main():
         
         # Save workflow file
         import yaml
+        try:
+            from yaml import CSafeDumper as Dumper
+        except ImportError:
+            from yaml import SafeDumper as Dumper
         with workflow_path.open("w", encoding="utf-8") as f:
-            yaml.dump(gha, f, sort_keys=False, width=1000)
+            yaml.dump(gha, f, Dumper=Dumper, sort_keys=False, width=1000)
         
         print(f" Main workflow saved to: {workflow_path}")
         print(f" Composite actions saved to: {output_dir / '.github' / 'actions'}")
         
         # Generate and save conversion report
-        report = generate_conversion_report(action_paths, jenkins_text)
+        report = generate_conversion_report(action_paths)
         with report_path.open("w", encoding="utf-8") as f:
             f.write(report)
         
@@ -54,14 +58,10 @@ def main():
         print(f"  - {workflow_path.relative_to(output_dir)}")
         print(f"  - {report_path.relative_to(output_dir)}")
         
-        # List generated composite actions
-        actions_dir = output_dir / ".github" / "actions"
-        if actions_dir.exists():
-            for action_dir in actions_dir.iterdir():
-                if action_dir.is_dir():
-                    action_file = action_dir / "action.yml"
-                    if action_file.exists():
-                        print(f"  - {action_file.relative_to(output_dir)}")
+        # List generated composite actions; paths are relative to output_dir and
+        # stages sharing a sanitized name share one action
+        for action_path in dict.fromkeys(info["path"] for info in action_paths):
+            print(f"  - {Path(action_path) / 'action.yml'}")
         
         print("\n Conversion completed! Check the CONVERSION_REPORT.md for next steps.")
         
@@ -0,0 +1,40 @@
+from converter import convert_jenkins_to_gha
+from jenkins_extractors import extract_steps_commands
+
+PIPELINE = """
+pipeline {
+    agent any
+    stages {
+        stage('Checkout') {
+            steps {
+                sh 'echo checkout'
+            }
+        }
+        stage('Build') {
+            environment {
+                MODE = 'release'
+            }
+            steps {
+                sh 'make build'
+            }
+        }
+    }
+}
+"""
+
+
+def test_mutating_results_does_not_leak_into_later_conversions(tmp_path):
+    _, action_paths = convert_jenkins_to_gha(PIPELINE, tmp_path / "first")
+    action_paths[1]["env"]["INJECTED"] = "oops"
+
+    gha, action_paths = convert_jenkins_to_gha(PIPELINE, tmp_path / "second")
+    assert gha["jobs"]["build"]["env"] == {"MODE": "release"}
+    assert action_paths[1]["env"] == {"MODE": "release"}
+    action_yml = tmp_path / "second" / ".github" / "actions" / "build" / "action.yml"
+    assert "INJECTED" not in action_yml.read_text(encoding="utf-8")
+
+
+def test_mutating_extractor_result_does_not_change_later_calls():
+    body = "steps { sh 'make test' }"
+    extract_steps_commands(body).append("rm -rf /")
+    assert extract_steps_commands(body) == ["make test"]
@@ -0,0 +1,102 @@
+from jenkins_extractors import (
+    extract_credentials_usage, extract_git_steps, extract_pipeline_post, extract_sonarqube_steps,
+    extract_steps_commands
+)
+
+
+def test_sshagent_list_yields_only_its_ids():
+    assert extract_credentials_usage("sshagent(['a', 'b']) { sh 'ssh host' }") == ["a", "b"]
+
+
+def test_credentials_keep_first_seen_order():
+    stage = """
+        sshagent(['ssh-key', 'other-key']) {
+            sh 'git push'
+        }
+        withCredentials([string(credentialsId: 'zeta', variable: 'Z'),
+                         string(credentialsId: 'ssh-key', variable: 'K')]) {
+            sh 'echo $Z'
+        }
+    """
+    assert extract_credentials_usage(stage) == ["ssh-key", "other-key", "zeta"]
+
+
+def test_sonarqube_block_body_may_contain_interpolation():
+    stage = """withSonarQubeEnv('S') { sh "mvn sonar:sonar -Dsonar.projectKey=${env.JOB_NAME}" }"""
+    assert extract_sonarqube_steps(stage) == [{
+        "credentialsId": "",
+        "installationName": "S",
+        "commands": ["mvn sonar:sonar -Dsonar.projectKey=${env.JOB_NAME}"],
+    }]
+
+
+def test_steps_commands_in_source_order_without_nested_matches():
+    stage = """
+        steps {
+            echo 'start'
+            sh '''
+                ./build.sh
+                echo "inside"
+            '''
+            sh 'make test'
+        }
+    """
+    # The echo inside the sh body is part of that script, not a separate step
+    assert extract_steps_commands(stage) == [
+        "echo start", "./build.sh", 'echo "inside"', "make test"
+    ]
+
+
+def test_git_arguments_in_any_order():
+    stage = "git credentialsId: 'gh-creds', url: 'https://example.com/app.git', branch: 'main'"
+    assert extract_git_steps(stage) == [
+        {"branch": "main", "url": "https://example.com/app.git", "credentialsId": "gh-creds"}
+    ]
+
+
+def test_git_parenthesized_form():
+    stage = "git(url: 'https://example.com/app.git', branch: 'dev')"
+    assert extract_git_steps(stage) == [
+        {"branch": "dev", "url": "https://example.com/app.git", "credentialsId": ""}
+    ]
+
+
+def test_git_bare_call_continued_after_trailing_comma():
+    stage = """
+        git branch: 'main',
+            credentialsId: 'gh-creds',
+            url: 'https://example.com/app.git'
+        sh 'make'
+    """
+    assert extract_git_steps(stage) == [
+        {"branch": "main", "url": "https://example.com/app.git", "credentialsId": "gh-creds"}
+    ]
+
+
+def test_sonarqube_positional_and_keyword_installation_name():
+    positional = "withSonarQubeEnv('Server') { sh 'mvn sonar:sonar' }"
+    keyword = "withSonarQubeEnv(credentialsId: 'sq', installationName: 'Other') { sh 'mvn sonar:sonar' }"
+    assert extract_sonarqube_steps(positional) == [
+        {"credentialsId": "", "installationName": "Server", "commands": ["mvn sonar:sonar"]}
+    ]
+    assert extract_sonarqube_steps(keyword) == [
+        {"credentialsId": "sq", "installationName": "Other", "commands": ["mvn sonar:sonar"]}
+    ]
+
+
+def test_pipeline_post_ignores_earlier_stage_post():
+    pipeline_body = """
+        agent any
+        stages {
+            stage('Build') {
+                steps { sh 'make' }
+                post {
+                    always { archiveArtifacts(artifacts: 'target/*.jar') }
+                }
+            }
+        }
+        post {
+            failure { archiveArtifacts(artifacts: 'logs/**') }
+        }
+    """
+    assert extract_pipeline_post(pipeline_body) == {"failure": {"archive": "logs/**"}}
@@ -0,0 +1,45 @@
+from jenkins_extractors import extract_steps_commands
+from utils import find_top_block, strip_comments
+
+
+def test_strip_comments_keeps_urls_in_strings():
+    assert strip_comments("git url: 'https://example.com/repo.git' // clone\n") == \
+        "git url: 'https://example.com/repo.git' \n"
+
+
+def test_strip_comments_after_triple_quoted_string_with_mixed_quotes():
+    stage = '''
+        steps {
+            sh """
+                git commit -m "it's done"
+            """
+            // sh 'echo SHOULD_NOT_RUN'
+            /* sh "rm -rf /old" */
+            sh 'echo after'
+        }
+    '''
+    stripped = strip_comments(stage)
+    assert "SHOULD_NOT_RUN" not in stripped
+    assert "rm -rf /old" not in stripped
+    assert extract_steps_commands(stage) == ['git commit -m "it\'s done"', "echo after"]
+
+
+def test_strip_comments_after_line_continuation_in_string():
+    # The continued string must pair its own quotes, or later strings and comments drift
+    assert strip_comments("def x = 'it\\\nsplits' // gone\nsh 'make' // too\n") == \
+        "def x = 'it\\\nsplits' \nsh 'make' \n"
+    assert strip_comments('def y = "a\\\nb // kept" // gone\n') == 'def y = "a\\\nb // kept" \n'
+
+
+def test_find_top_block_ignores_nested_blocks():
+    stage = """
+        steps {
+            withEnv(['A=1']) {
+                environment { NESTED = 'yes' }
+            }
+        }
+        environment { TOP = 'yes' }
+    """
+    s, e = find_top_block(stage, "environment")
+    assert stage[s:e].strip() == "TOP = 'yes'"
+    assert find_top_block("stage('x') { steps { sh 'make' } }", "steps") == (-1, -1)
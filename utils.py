@@ -2,15 +2,101 @@
 Utility functions for Jenkins pipeline parsing and conversion
 """
 
+import functools
 import re
-from typing import Tuple
+from typing import Dict, Tuple
+
+# Comments and quoted strings in one alternation; only the comment groups (1, 2) are removed,
+# so '//' inside a string such as 'https://...' survives. Groovy triple-quoted strings come
+# before the single-quoted ones, otherwise ''' would read as '' followed by an open quote.
+# Escapes use \\[\s\S] so a backslash-newline line continuation stays inside its string
+_COMMENT_OR_STR_RE = re.compile(
+    r"(/\*[\s\S]*?\*/)|(//[^\n]*)"
+    r"|('''(?:\\[\s\S]|[^\\])*?''')|(\"\"\"(?:\\[\s\S]|[^\\])*?\"\"\")"
+    r"|('(?:\\[\s\S]|[^'\\])*')|(\"(?:\\[\s\S]|[^\"\\])*\")"
+)
+_BRACE_RE = re.compile(r"[{}]")
+_WS_RE = re.compile(r"\s*")
+_TRAILING_IDENT_RE = re.compile(r"\b([A-Za-z_][A-Za-z0-9_]*)\s*$")
+_ALNUM = "abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789"
+
+
+class _ReplaceOthers(dict):
+    """str.translate table: listed code points map to themselves, every other one to repl"""
+
+    def __init__(self, keep: str, repl: str):
+        super().__init__((ord(c), ord(c)) for c in keep)
+        self._repl = ord(repl)
+
+    def __missing__(self, key: int) -> int:
+        return self._repl
+
+
+# Same character classes as [^a-zA-Z0-9_-] and [^a-zA-Z0-9], including non-ASCII input
+_SANITIZE_TBL = _ReplaceOthers(_ALNUM + "_-", "_")
+_JOB_ID_TBL = _ReplaceOthers(_ALNUM, "-")
+_U2D = str.maketrans({"_": "-"})
+# Uppercase ASCII letters and map '-' to '_' in a single pass
+_CRED_TBL = {ord('-'): ord('_'), **{c: c - 32 for c in range(ord('a'), ord('z') + 1)}}
 
 
 def strip_comments(text: str) -> str:
-    """Remove C-style and C++-style comments from text"""
-    text = re.sub(r"/\*.*?\*/", "", text, flags=re.DOTALL)
-    text = re.sub(r"//.*", "", text)
-    return text
+    """Remove C-style and C++-style comments from text, leaving string literals intact"""
+    return _COMMENT_OR_STR_RE.sub(lambda m: "" if m.group(1) or m.group(2) else m.group(0), text)
+
+
+@functools.lru_cache(maxsize=64)
+def tokenize_braces(text: str) -> Dict[int, int]:
+    """
+    Pair up every '{' in text with its matching '}' in a single pass
+    Returns {open_index: close_index}; unclosed braces are left out.
+    The cached mapping is shared between callers, do not mutate it
+    """
+    pairs: Dict[int, int] = {}
+    stack = []
+    for m in _BRACE_RE.finditer(text):
+        if m.group() == '{':
+            stack.append(m.start())
+        elif stack:
+            pairs[stack.pop()] = m.start()
+    return pairs
+
+
+@functools.lru_cache(maxsize=512)
+def scan_top_blocks(text: str) -> Dict[str, Tuple[int, int]]:
+    """
+    Walk text once and record the content span of every top-level 'name { ... }' block
+    Returns {name: (start_index, end_index)}; the first block wins when a name repeats.
+    The cached mapping is shared between callers, do not mutate it
+    """
+    blocks: Dict[str, Tuple[int, int]] = {}
+    depth = 0
+    seg_start = 0
+    name = None
+    start = -1
+    for m in _BRACE_RE.finditer(text):
+        pos = m.start()
+        if m.group() == '{':
+            if depth == 0:
+                ident = _TRAILING_IDENT_RE.search(text, seg_start, pos)
+                name = ident.group(1) if ident else None
+                start = pos + 1
+            depth += 1
+        elif depth > 0:
+            depth -= 1
+            if depth == 0:
+                if name and name not in blocks:
+                    blocks[name] = (start, pos)
+                seg_start = pos + 1
+    return blocks
+
+
+def find_top_block(text: str, name: str) -> Tuple[int, int]:
+    """
+    Find the top-level 'name { ... }' block of text
+    Returns (start_index, end_index) of content within braces, or (-1, -1) if not found
+    """
+    return scan_top_blocks(text).get(name, (-1, -1))
 
 
 def find_block(text: str, start_pat: str) -> Tuple[int, int]:
@@ -21,37 +107,40 @@ def find_block(text: str, start_pat: str) -> Tuple[int, int]:
     m = re.search(start_pat, text)
     if not m:
         return -1, -1
-    i = m.end()
-    while i < len(text) and text[i].isspace():
-        i += 1
+    i = _WS_RE.match(text, m.end()).end()
     if i >= len(text) or text[i] != '{':
         return -1, -1
-    depth = 0
-    start = i + 1
-    i += 1
-    while i < len(text):
-        if text[i] == '{':
-            depth += 1
-        elif text[i] == '}':
-            if depth == 0:
-                return start, i
-            depth -= 1
-        i += 1
-    return -1, -1
+    end = tokenize_braces(text).get(i)
+    if end is None:
+        return -1, -1
+    return i + 1, end
 
 
+@functools.lru_cache(maxsize=1024)
 def sanitize_name(name: str) -> str:
     """Sanitize names for file paths and action names"""
-    return re.sub(r'[^a-zA-Z0-9_-]', '_', name.strip())
+    return name.strip().translate(_SANITIZE_TBL)
 
 
+@functools.lru_cache(maxsize=1024)
 def gha_job_id(name: str) -> str:
     """Convert stage name to GitHub Actions job ID"""
-    slug = re.sub(r"[^a-zA-Z0-9]+", "-", name.strip()).strip("-").lower()
+    # Splitting on '-' and dropping empty parts collapses dash runs and trims both ends
+    slug = "-".join(filter(None, name.translate(_JOB_ID_TBL).split("-"))).lower()
     return slug or "job"
 
 
+@functools.lru_cache(maxsize=1024)
+def env_input_name(key: str) -> str:
+    """Convert an environment variable name to a composite action input name"""
+    return key.lower().translate(_U2D)
+
+
+def secret_name(cred_id: str) -> str:
+    """Convert a Jenkins credential ID to a GitHub secret name"""
+    return cred_id.translate(_CRED_TBL)
+
+
 def multiline_to_commands(s: str) -> list[str]:
     """Convert multiline string to list of commands, filtering empty lines"""
-    lines = [ln.strip() for ln in s.splitlines()]
-    return [ln for ln in lines if ln]
+    return list(filter(None, map(str.strip, s.splitlines())))